@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+# Events waiting for a slow client before newer ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class _Subscription:
+    def __init__(self, employee_id):
+        self.employee_id = employee_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+
+class LeaveEventHub:
+    """In-process fan-out of leave status events to connected employees.
+
+    Each open event stream is a queue on the server's event loop, so an idle
+    connection costs one suspended coroutine and no thread. Events are
+    published from request threads and handed over with call_soon_threadsafe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, employee_id):
+        subscription = _Subscription(employee_id)
+        with self._lock:
+            self._subscriptions.setdefault(employee_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.employee_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.employee_id, None)
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def dispatch(self, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(event['employee'], ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The loop has shut down; the stream is gone
+                self.unsubscribe(subscription)
+
+
+hub = LeaveEventHub()
+
+
+class InProcessBroker:
+    """Delivers events to streams served by this process only."""
+
+    def publish(self, event):
+        hub.dispatch(event)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class SpoolFileBroker:
+    """Local stand-in for a pub/sub server when several processes serve streams.
+
+    Every process appends events as JSON lines to LEAVE_EVENTS_SPOOL and tails
+    the same file from a daemon thread, dispatching what it reads to its own hub.
+    Only suitable for processes on one host.
+
+    Once the spool reaches LEAVE_EVENTS_SPOOL_MAX_BYTES the next publisher
+    truncates it, and tailers start again from the top. An event published
+    by another process at that same moment may be lost.
+    """
+
+    poll_interval = 0.2
+
+    def __init__(self):
+        self.path = settings.LEAVE_EVENTS_SPOOL
+        self.max_bytes = settings.LEAVE_EVENTS_SPOOL_MAX_BYTES
+        self._thread = None
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def publish(self, event):
+        line = (json.dumps(event) + '\n').encode()
+        # O_APPEND keeps concurrent writers' lines intact
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size >= self.max_bytes:
+                os.ftruncate(fd, 0)
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            # Only events published after this process starts listening are delivered
+            open(self.path, 'ab').close()
+            position = os.path.getsize(self.path)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._tail, args=(position,), name='leave-events-tail', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._start_lock:
+            if self._thread is None:
+                return
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _tail(self, position):
+        while not self._stop.is_set():
+            try:
+                if os.path.getsize(self.path) < position:
+                    position = 0  # The spool was truncated or rotated
+                with open(self.path, 'rb') as spool:
+                    spool.seek(position)
+                    for line in spool:
+                        if not line.endswith(b'\n'):
+                            break  # Partial write, read it on the next pass
+                        position += len(line)
+                        self._dispatch(line)
+            except OSError:
+                pass
+            self._stop.wait(self.poll_interval)
+
+    def _dispatch(self, line):
+        # A malformed line is skipped; it must not stop the thread for everyone
+        try:
+            hub.dispatch(json.loads(line))
+        except Exception:
+            pass
+
+
+broker = SimpleLazyObject(lambda: import_string(settings.LEAVE_EVENTS_BROKER)())
+
+
+def leave_event(application):
+    return {
+        'employee': application.empid_id,
+        'aplid': application.aplid,
+        'status': application.status,
+        'status_display': application.get_status_display(),
+    }
+
+
+def format_event(event):
+    return f"event: status\nid: {event['aplid']}\ndata: {json.dumps(event)}\n\n"
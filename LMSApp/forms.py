@@ -5,7 +5,7 @@ from LMSApp import models
 class EmployeeForm(forms.ModelForm):
     class Meta:
         model = models.Employee
-        fields = ['empid', 'name', 'email']
+        fields = ['empid', 'name', 'email', 'manager']
 
     def clean_empid(self):
         empid = self.cleaned_data.get('empid')
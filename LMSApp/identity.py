@@ -0,0 +1,154 @@
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Exists, OuterRef
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from .models import Employee
+
+IDENTITY_KEY = 'lms:identity:{}'
+VERSION_KEY = 'lms:identity-version:{}'
+
+
+def role_for(user):
+    if user.is_superuser:
+        return 'admin'
+    is_manager = getattr(user, 'is_manager', None)
+    if is_manager is None:
+        # Loaded without the annotation, e.g. the user returned by authenticate()
+        is_manager = Employee.objects.filter(manager__user=user).exists()
+    return 'manager' if is_manager else 'employee'
+
+
+class IdentityBackend(ModelBackend):
+    """ModelBackend that loads the user, their Employee and their role in one query.
+
+    ``user.employee`` is prefetched and ``user.role`` is one of 'admin',
+    'manager' or 'employee'.
+    """
+
+    def get_user(self, user_id):
+        queryset = auth.get_user_model()._default_manager.select_related('employee').annotate(
+            is_manager=Exists(Employee.objects.filter(manager__user=OuterRef('pk'))),
+        )
+        try:
+            user = queryset.get(pk=user_id)
+        except queryset.model.DoesNotExist:
+            return None
+        user.role = role_for(user)
+        return user if self.user_can_authenticate(user) else None
+
+
+IDENTITY_BACKEND = f'{IdentityBackend.__module__}.{IdentityBackend.__qualname__}'
+# Stored by sessions that logged in before IdentityBackend existed
+LEGACY_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def identity_version(user_id):
+    # Random-enough token replaced on every change, so an evicted version key
+    # can never make an old cached identity look current again
+    key = VERSION_KEY.format(user_id)
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def invalidate_identity(user_id):
+    if user_id is None:
+        return
+    key = VERSION_KEY.format(user_id)
+    cache.set(key, time.time_ns(), None)
+    # Bump again once committed, in case another request cached the old row meanwhile
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+def _field_values(instance, exclude=()):
+    return {field.attname: getattr(instance, field.attname)
+            for field in instance._meta.concrete_fields if field.attname not in exclude}
+
+
+def cached_identity(user, version):
+    # Only what a warm request needs. The password hash stays out of the cache;
+    # the session is checked against the precomputed session auth hash instead.
+    employee = getattr(user, 'employee', None)
+    return {
+        'version': version,
+        'user': _field_values(user, exclude={'password'}),
+        'employee': _field_values(employee) if employee is not None else None,
+        'role': user.role,
+        'session_hash': user.get_session_auth_hash(),
+    }
+
+
+def identity_user(identity):
+    # Rebuilt as if loaded from the primary; the password is a deferred field
+    fields = identity['user']
+    user = auth.get_user_model().from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+    employee = None
+    if identity['employee'] is not None:
+        fields = identity['employee']
+        employee = Employee.from_db(DEFAULT_DB_ALIAS, list(fields), list(fields.values()))
+        Employee._meta.get_field('user').set_cached_value(employee, user)
+    user._meta.get_field('employee').set_cached_value(user, employee)
+    user.role = identity['role']
+    return user
+
+
+def get_identity(request):
+    if hasattr(request, '_cached_user'):
+        return request._cached_user
+
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    backend_path = session.get(BACKEND_SESSION_KEY)
+    if user_id is not None and backend_path == LEGACY_BACKEND:
+        # IdentityBackend loads the same users, so move the session over to it
+        # rather than keep ModelBackend listed in AUTHENTICATION_BACKENDS
+        session[BACKEND_SESSION_KEY] = backend_path = IDENTITY_BACKEND
+    session_hash = session.get(HASH_SESSION_KEY)
+    cacheable = user_id is not None and session.session_key and backend_path == IDENTITY_BACKEND
+
+    if cacheable:
+        key = IDENTITY_KEY.format(session.session_key)
+        version = identity_version(user_id)
+        cached = cache.get(key)
+        if (cached is not None and cached['version'] == version and session_hash
+                and constant_time_compare(session_hash, cached['session_hash'])):
+            user = identity_user(cached)
+            request._cached_user = user
+            return user
+
+    # Cold path: one query through IdentityBackend.get_user, plus Django's session checks
+    user = auth.get_user(request)
+    if user.is_authenticated and not hasattr(user, 'role'):
+        user.role = role_for(user)
+    if cacheable and user.is_authenticated:
+        cache.set(key, cached_identity(user, version), settings.IDENTITY_CACHE_TIMEOUT)
+    request._cached_user = user
+    return user
+
+
+async def aget_identity(request):
+    return await sync_to_async(get_identity)(request)
+
+
+class IdentityMiddleware(AuthenticationMiddleware):
+    """AuthenticationMiddleware that reuses the identity cached for this session.
+
+    A warm request resolves ``request.user`` (with ``employee`` and ``role``)
+    from the cache without touching the database. Saving a User or Employee
+    replaces the user's version token, which retires every cached copy.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_identity(request))
+        request.auser = partial(aget_identity, request)
@@ -0,0 +1,162 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.utils import timezone
+
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Routine SQLite maintenance, safe to run from cron: prunes expired sessions in "
+        "batches, refreshes planner statistics (ANALYZE / PRAGMA optimize), runs a "
+        "time-boxed incremental vacuum and reports table sizes, index statistics and "
+        "fragmentation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias to maintain (default: "default").')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Expired sessions deleted per transaction.')
+        parser.add_argument('--vacuum-seconds', type=float, default=5.0,
+                            help='Time budget for the incremental vacuum (at least one step always runs).')
+        parser.add_argument('--vacuum-pages', type=int, default=100,
+                            help='Free pages released per incremental vacuum step.')
+        parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                            help='Switch the database to auto_vacuum=INCREMENTAL. '
+                                 'This runs one full VACUUM, so schedule it off-hours.')
+        parser.add_argument('--skip-sessions', action='store_true', help='Do not prune sessions.')
+        parser.add_argument('--skip-analyze', action='store_true', help='Do not run ANALYZE.')
+        parser.add_argument('--skip-vacuum', action='store_true', help='Do not vacuum.')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError('dbmaintenance only supports SQLite databases.')
+        if options['batch_size'] < 1 or options['vacuum_pages'] < 1:
+            raise CommandError('--batch-size and --vacuum-pages must be positive.')
+
+        if not options['skip_sessions']:
+            self.prune_sessions(options['database'], options['batch_size'])
+        if not options['skip_analyze']:
+            self.analyze(connection)
+        if not options['skip_vacuum']:
+            self.vacuum(connection, options)
+        self.report(connection)
+
+    def prune_sessions(self, database, batch_size):
+        if settings.SESSION_ENGINE not in DB_SESSION_ENGINES:
+            self.stdout.write('Sessions: not stored in the database, skipped.')
+            return
+
+        from django.contrib.sessions.models import Session
+
+        # Small batches keep each write lock short so live logins are not blocked
+        now = timezone.now()
+        expired = Session.objects.using(database).filter(expire_date__lt=now)
+        deleted = 0
+        while True:
+            keys = list(expired.values_list('session_key', flat=True)[:batch_size])
+            if not keys:
+                break
+            deleted += Session.objects.using(database).filter(session_key__in=keys).delete()[0]
+        self.stdout.write(f'Sessions: pruned {deleted} expired session(s).')
+
+    def analyze(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            cursor.execute('PRAGMA optimize')
+        self.stdout.write('Statistics: ANALYZE and PRAGMA optimize complete.')
+
+    def vacuum(self, connection, options):
+        with connection.cursor() as cursor:
+            mode = self.pragma(cursor, 'auto_vacuum')
+            if mode != 2 and options['enable_incremental_vacuum']:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')  # Required once for the new mode to take effect
+                self.stdout.write('Vacuum: switched to auto_vacuum=INCREMENTAL (full VACUUM).')
+                return
+            if mode != 2:
+                self.stdout.write('Vacuum: auto_vacuum is not INCREMENTAL, skipped '
+                                  '(run once with --enable-incremental-vacuum).')
+                return
+
+            before = self.pragma(cursor, 'freelist_count')
+            deadline = time.monotonic() + options['vacuum_seconds']
+            while before:
+                # incremental_vacuum frees one page per step of the statement, and
+                # the cursor only runs the first step; executescript runs it to the
+                # end, releasing up to --vacuum-pages pages per round.
+                connection.connection.executescript(f"PRAGMA incremental_vacuum({options['vacuum_pages']});")
+                if time.monotonic() >= deadline or not self.pragma(cursor, 'freelist_count'):
+                    break
+            after = self.pragma(cursor, 'freelist_count')
+        self.stdout.write(f'Vacuum: released {before - after} page(s), {after} free page(s) left.')
+
+    def report(self, connection):
+        with connection.cursor() as cursor:
+            page_size = self.pragma(cursor, 'page_size')
+            page_count = self.pragma(cursor, 'page_count')
+            freelist = self.pragma(cursor, 'freelist_count')
+            self.stdout.write(
+                f'Database: {page_count * page_size} bytes, {freelist}/{page_count} free pages '
+                f'({self.percent(freelist, page_count)} fragmentation).'
+            )
+
+            cursor.execute(
+                "SELECT name, tbl_name, type FROM sqlite_master WHERE type IN ('table', 'index')"
+            )
+            objects = {name: (table, kind) for name, table, kind in cursor.fetchall()}
+
+            # dbstat is optional in SQLite builds; without it only row counts are shown
+            try:
+                cursor.execute('SELECT name, SUM(pgsize), SUM(unused) FROM dbstat GROUP BY name')
+                sizes = {name: (size, unused) for name, size, unused in cursor.fetchall()}
+            except OperationalError:
+                sizes = None
+
+            self.stdout.write('Tables:')
+            tables = sorted(name for name, (_, kind) in objects.items()
+                            if kind == 'table' and not name.startswith('sqlite_'))
+            for table in tables:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                rows = cursor.fetchone()[0]
+                if sizes is None:
+                    self.stdout.write(f'  {table}: {rows} row(s)')
+                    continue
+                size, unused = sizes.get(table, (0, 0))
+                index_bytes = sum(sizes.get(name, (0, 0))[0] for name, (owner, kind) in objects.items()
+                                  if kind == 'index' and owner == table)
+                self.stdout.write(
+                    f'  {table}: {rows} row(s), {size} bytes data, {index_bytes} bytes indexes, '
+                    f'{self.percent(unused, size)} unused'
+                )
+
+            # SQLite does not count index lookups; sqlite_stat1 (written by ANALYZE)
+            # shows how selective each index is, which is what the planner uses.
+            self.stdout.write('Indexes (rows, average rows per key):')
+            try:
+                cursor.execute('SELECT tbl, idx, stat FROM sqlite_stat1 WHERE idx IS NOT NULL ORDER BY tbl, idx')
+                stats = cursor.fetchall()
+            except OperationalError:
+                stats = []
+            if not stats:
+                self.stdout.write('  no statistics yet, run without --skip-analyze.')
+            for table, index, stat in stats:
+                values = stat.split()
+                self.stdout.write(f"  {table}.{index}: {values[0]}, {' '.join(values[1:])}")
+
+    @staticmethod
+    def pragma(cursor, name):
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+    @staticmethod
+    def percent(part, whole):
+        return f'{100 * part / whole:.1f}%' if whole else '0.0%'
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_self_paths(apps, schema_editor):
+    # Existing employees have no manager yet, so each is the root of its own tree
+    Employee = apps.get_model('LMSApp', 'Employee')
+    OrgTreePath = apps.get_model('LMSApp', 'OrgTreePath')
+    db = schema_editor.connection.alias
+    OrgTreePath.objects.using(db).bulk_create(
+        OrgTreePath(ancestor_id=pk, descendant_id=pk, depth=0)
+        for pk in Employee.objects.using(db).values_list('pk', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('LMSApp', '0006_alter_leaveapl_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='manager',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reports', to='LMSApp.employee'),
+        ),
+        migrations.CreateModel(
+            name='OrgTreePath',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_paths', to='LMSApp.employee')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_paths', to='LMSApp.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ancestor', 'depth'], name='org_tree_ancestor_depth_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_org_tree_path')],
+            },
+        ),
+        migrations.RunPython(add_self_paths, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User  # Import the User model
 from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS
+
+MANAGER_CYCLE_ERROR = "An employee cannot report to themselves or to someone under them."
 
 def generate_empid():
     try:
@@ -15,10 +18,34 @@ class Employee(models.Model):
     empid = models.IntegerField(unique=True) #max_length=8)
     name = models.CharField(max_length=200)
     email = models.EmailField(max_length=150)
+    manager = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='reports')
 
     def __str__(self) -> str:
         return str(self.empid)
 
+    def clean(self):
+        # A manager inside this employee's own subtree would make the org tree a cycle.
+        # Read from the primary: a stale replica could let a cycle through.
+        if self.pk and self.manager_id and OrgTreePath.objects.using(DEFAULT_DB_ALIAS).filter(
+                ancestor=self, descendant_id=self.manager_id).exists():
+            raise ValidationError({'manager': MANAGER_CYCLE_ERROR})
+
+class OrgTreePath(models.Model):
+    # Closure table of the manager hierarchy: one row per (ancestor, descendant)
+    # pair, including each employee with itself at depth 0. Maintained by
+    # LMSApp.orgtree; do not edit directly.
+    ancestor = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='descendant_paths')
+    descendant = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='ancestor_paths')
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_org_tree_path'),
+        ]
+        indexes = [
+            models.Index(fields=['ancestor', 'depth'], name='org_tree_ancestor_depth_idx'),
+        ]
+
 class LeaveApl(models.Model):
     aplid = models.AutoField(primary_key=True)
     empid = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -0,0 +1,74 @@
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import MANAGER_CYCLE_ERROR, LeaveApl, OrgTreePath
+
+# The closure table holds a row for every (ancestor, descendant) pair, so
+# subtree queries are a single indexed join on OrgTreePath instead of a
+# walk over Employee.manager. Rows are kept in sync from the Employee
+# post_save and pre_delete signals (see signals.py). The functions that
+# read before writing run in a transaction, which also keeps their reads
+# on the primary database.
+
+
+def in_subtree(employee, root):
+    # True if employee is root or reports to root at any depth
+    return OrgTreePath.objects.using(DEFAULT_DB_ALIAS).filter(ancestor=root, descendant=employee).exists()
+
+
+def manages(manager, employee):
+    # Permission check: read from the primary so a moved manager loses access at once
+    return OrgTreePath.objects.using(DEFAULT_DB_ALIAS).filter(ancestor=manager, descendant=employee, depth__gt=0).exists()
+
+
+def team_applications(manager):
+    # Leave applications of everyone under manager, any depth
+    return LeaveApl.objects.filter(
+        empid__ancestor_paths__ancestor=manager,
+        empid__ancestor_paths__depth__gt=0,
+    )
+
+
+@transaction.atomic
+def add_employee(employee):
+    paths = [OrgTreePath(ancestor=employee, descendant=employee, depth=0)]
+    if employee.manager_id is not None:
+        paths += [
+            OrgTreePath(ancestor_id=ancestor_id, descendant=employee, depth=depth + 1)
+            for ancestor_id, depth in OrgTreePath.objects.filter(
+                descendant_id=employee.manager_id).values_list('ancestor_id', 'depth')
+        ]
+    OrgTreePath.objects.bulk_create(paths)
+
+
+@transaction.atomic
+def sync_employee(employee):
+    # Relink employee's subtree if its manager no longer matches the closure
+    # table. Returns the manager id the table had before.
+    parent_id = OrgTreePath.objects.filter(descendant=employee, depth=1).values_list('ancestor_id', flat=True).first()
+    if parent_id == employee.manager_id:
+        return parent_id
+
+    subtree = dict(OrgTreePath.objects.filter(ancestor=employee).values_list('descendant_id', 'depth'))
+
+    # Drop the paths from the old ancestors into the subtree; paths inside it stay
+    OrgTreePath.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+
+    if employee.manager_id is not None:
+        ancestors = OrgTreePath.objects.filter(descendant_id=employee.manager_id).values_list('ancestor_id', 'depth')
+        OrgTreePath.objects.bulk_create(
+            OrgTreePath(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + descendant_depth + 1)
+            for ancestor_id, ancestor_depth in ancestors
+            for descendant_id, descendant_depth in subtree.items()
+        )
+    return parent_id
+
+
+def move_employee(employee, manager):
+    """Puts employee, with everyone under them, below manager (None for a root)."""
+    with transaction.atomic():
+        if manager is not None and in_subtree(manager, employee):
+            raise ValidationError(MANAGER_CYCLE_ERROR)
+        employee.manager = manager
+        employee.save(update_fields=['manager'])
+
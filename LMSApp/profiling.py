@@ -0,0 +1,165 @@
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+PROFILE_HEADER = 'HTTP_X_LMS_PROFILE'
+CAPTURE_INDEX = 'captures.jsonl'
+FOLDED_SUFFIX = '.folded'
+# Bytes read at a time from the end of the capture index
+CAPTURE_READ_SIZE = 8192
+
+
+def profile_dir():
+    return Path(settings.PROFILE_DIR)
+
+
+def profile_file_name(view_name):
+    # Collapsed stacks are aggregated per view, one file each
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', view_name) + FOLDED_SUFFIX
+
+
+class StackSampler:
+    """Samples one thread's Python stack at a fixed interval from a helper thread.
+
+    Stacks are recorded root-first as ``module:function`` frames joined by ``;``,
+    the collapsed format read by flamegraph.pl, inferno and speedscope.
+    """
+
+    def __init__(self, thread_id, interval, root_code=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root_code = root_code
+        self.samples = Counter()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='lms-stack-sampler', daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+                if frame.f_code is self.root_code:
+                    break  # Frames above the profiling middleware are server plumbing
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+
+def save_capture(view_name, sampler):
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    file_name = profile_file_name(view_name)
+
+    # Appending keeps concurrent workers safe; flamegraph tools sum repeated stacks
+    lines = ''.join(f'{stack} {count}\n' for stack, count in sampler.samples.items())
+    with open(directory / file_name, 'a') as folded:
+        folded.write(lines)
+
+    capture = {
+        'view': view_name,
+        'file': file_name,
+        'time': time.time(),
+        'duration_ms': round(sampler.duration * 1000, 1),
+        'samples': sum(sampler.samples.values()),
+    }
+    with open(directory / CAPTURE_INDEX, 'a') as index:
+        index.write(json.dumps(capture) + '\n')
+    return file_name
+
+
+def recent_captures(limit=50):
+    # The index only grows, so read back from its end until limit lines are in
+    try:
+        with open(profile_dir() / CAPTURE_INDEX, 'rb') as index:
+            end = start = index.seek(0, os.SEEK_END)
+            tail = b''
+            while start > 0 and tail.count(b'\n') <= limit:
+                start = max(0, start - CAPTURE_READ_SIZE)
+                index.seek(start)
+                tail = index.read(end - start)
+    except FileNotFoundError:
+        return []
+    lines = tail.splitlines()
+    if start > 0:
+        lines = lines[1:]  # Starts mid-line
+    return [json.loads(line) for line in reversed(lines[-limit:])]
+
+
+def profile_files():
+    return sorted(profile_dir().glob('*' + FOLDED_SUFFIX))
+
+
+def profile_summaries():
+    summaries = []
+    for path in profile_files():
+        with open(path) as folded:
+            samples = sum(int(line.rsplit(' ', 1)[1]) for line in folded if line.strip())
+        summaries.append({'file': path.name, 'samples': samples, 'size': path.stat().st_size})
+    return summaries
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """Samples 1 in PROFILE_SAMPLE_EVERY requests, or any superuser request that
+    sends an ``X-LMS-Profile`` header, and appends its stacks to the view's
+    collapsed-stack file in PROFILE_DIR.
+
+    The view is called from process_view, which Django runs in the thread
+    that would run a sync view under both WSGI and ASGI, so that thread is
+    the one sampled. Middleware listed after it gets no process_view call for
+    a sampled request, so it must come last in MIDDLEWARE. Async views are
+    left to Django and not profiled. With PROFILE_ENABLED off the middleware
+    removes itself at startup.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILE_ENABLED', False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.sample_every = settings.PROFILE_SAMPLE_EVERY
+        self.interval = settings.PROFILE_INTERVAL
+        self.counter = itertools.count(1)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if iscoroutinefunction(view_func):
+            return None
+        requested = PROFILE_HEADER in request.META and request.user.is_superuser
+        if not requested and not self.sampled():
+            return None
+
+        sampler = StackSampler(threading.get_ident(), self.interval, root_code=ProfilingMiddleware.process_view.__code__)
+        sampler.start()
+        try:
+            response = view_func(request, *view_args, **view_kwargs)
+        finally:
+            sampler.stop()
+
+        file_name = save_capture(request.resolver_match.view_name, sampler)
+        # Only the admin who asked learns that profiling ran
+        if requested:
+            response['X-LMS-Profile'] = file_name
+        return response
+
+    def sampled(self):
+        return bool(self.sample_every) and next(self.counter) % self.sample_every == 0
@@ -0,0 +1,108 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Per-request read-your-writes state, set up by ReplicaPinMiddleware.
+# None outside a request (management commands, shell), where reads always use replicas.
+_pin_state = ContextVar('lms_replica_pin', default=None)
+
+PIN_COOKIE_NAME = 'lms_primary_pin'
+
+# Login state must never lag: a session or user row missing on a replica logs
+# the client out, so these apps always read from the primary.
+PRIMARY_ONLY_APPS = {'sessions', 'auth', 'contenttypes'}
+
+# Requests that may write. They read from the primary from the start, so an
+# object loaded before the first write is never a stale copy saved back whole.
+UNSAFE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def read_replicas():
+    return getattr(settings, 'READ_REPLICAS', [])
+
+
+def is_pinned():
+    state = _pin_state.get()
+    return state is not None and state['pinned']
+
+
+class ReplicaRouter:
+    """Sends writes to the primary and spreads reads across READ_REPLICAS."""
+
+    def db_for_read(self, model, **hints):
+        replicas = read_replicas()
+        if not replicas or is_pinned() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        # Reads inside a transaction must see that transaction's writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so every object lives in the same database
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """Reads unsafe requests from the primary and keeps a client there for
+    REPLICA_PIN_SECONDS after a successful write.
+
+    The pin is a short-lived cookie, so an employee redirected from ``apply``
+    to ``history`` reads their new application even if the replica lags.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin_state.reset(token)
+        return self.finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin_state.reset(token)
+        return self.finish(state, response)
+
+    def start(self, request):
+        unsafe = request.method in UNSAFE_METHODS
+        state = {
+            'pinned': unsafe or PIN_COOKIE_NAME in request.COOKIES,
+            'unsafe': unsafe,
+        }
+        return state, _pin_state.set(state)
+
+    def finish(self, state, response):
+        # Views here follow post/redirect/get: a successful write redirects,
+        # while a rejected form re-renders with 200 and wrote nothing.
+        if state['unsafe'] and response.status_code in (301, 302, 303, 307, 308) and read_replicas():
+            response.set_cookie(
+                PIN_COOKIE_NAME,
+                '1',
+                max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import orgtree
+from .events import broker, leave_event
+from .identity import invalidate_identity
+from .models import Employee, LeaveApl
+
+
+@receiver(post_save, sender=LeaveApl)
+def publish_leave_status(sender, instance, **kwargs):
+    # Publish only once the change is committed, so a client that reloads on the event sees it
+    event = leave_event(instance)
+    transaction.on_commit(lambda: broker.publish(event), using=kwargs.get('using'))
+
+
+@receiver(post_save, sender=Employee)
+def sync_org_tree(sender, instance, created, **kwargs):
+    if created:
+        orgtree.add_employee(instance)
+        changed_managers = {instance.manager_id}
+    else:
+        previous_manager_id = orgtree.sync_employee(instance)
+        changed_managers = {previous_manager_id, instance.manager_id} if previous_manager_id != instance.manager_id else set()
+    invalidate_identity(instance.user_id)
+    # Gaining or losing a report changes a manager's role
+    invalidate_manager_identities(changed_managers)
+
+
+@receiver(pre_delete, sender=Employee)
+def detach_reports(sender, instance, **kwargs):
+    # on_delete=SET_NULL skips save signals, so detach the reports' subtrees here
+    for report in instance.reports.all():
+        orgtree.move_employee(report, None)
+
+
+@receiver(post_delete, sender=Employee)
+def forget_employee_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.user_id)
+    invalidate_manager_identities({instance.manager_id})
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_user_identity(sender, instance, **kwargs):
+    invalidate_identity(instance.pk)
+
+
+def invalidate_manager_identities(manager_ids):
+    manager_ids.discard(None)
+    if manager_ids:
+        for user_id in Employee.objects.filter(pk__in=manager_ids).values_list('user_id', flat=True):
+            invalidate_identity(user_id)
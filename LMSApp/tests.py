@@ -1,9 +1,30 @@
-from django.test import TestCase
-from django.urls import reverse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse, HttpResponseRedirect
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import resolve, reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Employee, LeaveApl
-from .forms import LeaveAplForm
+from .models import Employee, LeaveApl, OrgTreePath
+from .forms import EmployeeForm, LeaveAplForm
+from .events import SpoolFileBroker, hub
+from .identity import IDENTITY_BACKEND, IDENTITY_KEY
+from .orgtree import manages, move_employee, team_applications
+from .profiling import ProfilingMiddleware, profile_summaries, recent_captures
+from .routers import PIN_COOKIE_NAME, ReplicaPinMiddleware, ReplicaRouter
 
 class EmployeeCRUDTest(TestCase):
 
@@ -164,3 +185,612 @@ class ExtendedEmployeeCRUDTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'admin_dashboard.html')
         self.assertContains(response, 'leave_applications')  # Check context variable availability
+
+
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    @override_settings(READ_REPLICAS=['replica1', 'replica2'])
+    def test_reads_go_to_replicas_outside_a_request(self):
+        self.assertIn(self.router.db_for_read(LeaveApl), ['replica1', 'replica2'])
+        self.assertEqual(self.router.db_for_write(LeaveApl), 'default')
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_login_state_is_read_from_primary(self):
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    @override_settings(READ_REPLICAS=[])
+    def test_reads_go_to_primary_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(LeaveApl), 'default')
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_migrations_only_run_on_primary(self):
+        self.assertTrue(self.router.allow_migrate('default', 'LMSApp'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'LMSApp'))
+
+    @override_settings(READ_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5)
+    def test_unsafe_request_reads_primary_and_pins_after_redirect(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(LeaveApl))  # Before any write
+            return HttpResponseRedirect('/history/')
+
+        response = ReplicaPinMiddleware(view)(self.factory.post('/apply/'))
+        self.assertEqual(reads, ['default'])
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], 5)
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_rejected_form_does_not_pin(self):
+        def view(request):
+            return HttpResponse('form errors')
+
+        response = ReplicaPinMiddleware(view)(self.factory.post('/apply/'))
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_write_lookups_in_safe_request_do_not_pin(self):
+        reads = []
+
+        def view(request):
+            self.router.db_for_write(Employee)  # e.g. a unique check in full_clean
+            reads.append(self.router.db_for_read(LeaveApl))
+            return HttpResponse()
+
+        response = ReplicaPinMiddleware(view)(self.factory.get('/history/'))
+        self.assertEqual(reads, ['replica1'])
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_pin_cookie_sends_reads_to_primary(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(LeaveApl))
+            return HttpResponse()
+
+        request = self.factory.get('/history/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        response = ReplicaPinMiddleware(view)(request)
+        self.assertEqual(reads, ['default'])
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+        # Without the cookie the same request reads from the replica
+        ReplicaPinMiddleware(view)(self.factory.get('/history/'))
+        self.assertEqual(reads, ['default', 'replica1'])
+
+
+class ReplicaLoginTest(TransactionTestCase):
+    # Outside TestCase's wrapping transaction, so the router really picks replicas
+
+    def setUp(self):
+        User.objects.create_user(username='emp', password='emppass')
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_client_stays_logged_in_after_pin_expires(self):
+        # replica1 is not a configured database, so any session or user read
+        # routed to it would fail instead of silently logging the client out
+        self.client.login(username='emp', password='emppass')
+        self.client.cookies.pop(PIN_COOKIE_NAME, None)
+        cache.clear()  # Drop cached sessions and identities so both are read again
+
+        response = self.client.get(reverse('home'))
+        self.assertTrue(response.context['user'].is_authenticated)
+
+
+class DbMaintenanceCommandTest(TransactionTestCase):
+
+    def test_prunes_expired_sessions_in_batches(self):
+        now = timezone.now()
+        for i in range(5):
+            Session.objects.create(session_key=f'expired{i}', session_data='', expire_date=now - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=now + timedelta(days=1))
+
+        out = StringIO()
+        call_command('dbmaintenance', '--batch-size', '2', stdout=out)
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        self.assertIn('pruned 5 expired session(s)', out.getvalue())
+        self.assertIn('django_session', out.getvalue())
+
+    def test_incremental_vacuum_skipped_until_enabled(self):
+        out = StringIO()
+        call_command('dbmaintenance', '--skip-sessions', '--skip-analyze', stdout=out)
+        self.assertIn('run once with --enable-incremental-vacuum', out.getvalue())
+
+    def test_incremental_vacuum_releases_requested_pages(self):
+        maintain = ('dbmaintenance', '--skip-sessions', '--skip-analyze')
+        call_command(*maintain, '--enable-incremental-vacuum', stdout=StringIO())
+        self.addCleanup(self.disable_auto_vacuum)
+        with connections['default'].cursor() as cursor:
+            cursor.execute('CREATE TABLE vacuum_filler (data TEXT)')
+            cursor.executemany('INSERT INTO vacuum_filler VALUES (?)', [('x' * 2000,)] * 200)
+            cursor.execute('DROP TABLE vacuum_filler')
+            before = self.freelist_count(cursor)
+        self.assertGreater(before, 10)
+
+        call_command(*maintain, '--vacuum-pages', '10', '--vacuum-seconds', '0', stdout=StringIO())
+
+        with connections['default'].cursor() as cursor:
+            self.assertEqual(self.freelist_count(cursor), before - 10)
+
+    def disable_auto_vacuum(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA auto_vacuum = NONE')
+            cursor.execute('VACUUM')
+
+    @staticmethod
+    def freelist_count(cursor):
+        cursor.execute('PRAGMA freelist_count')
+        return cursor.fetchone()[0]
+
+
+class LeaveEventsTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='emp', password='emppass')
+        self.employee = Employee.objects.create(user=self.user, empid=2001, name='Emp', email='emp@example.com')
+        self.leave = LeaveApl.objects.create(
+            empid=self.employee,
+            leaveDate=date.today(),
+            returnDate=date.today() + timedelta(days=1),
+            reason='PTO',
+        )
+
+    def test_status_change_is_published_on_commit(self):
+        with mock.patch('LMSApp.signals.broker') as broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.leave.status = 'ACP'
+                self.leave.save()
+        broker.publish.assert_called_once_with({
+            'employee': self.employee.id,
+            'aplid': self.leave.aplid,
+            'status': 'ACP',
+            'status_display': 'Accepted',
+        })
+
+    async def test_hub_delivers_events_published_from_other_threads(self):
+        subscription = hub.subscribe(self.employee.id)
+        try:
+            event = {'employee': self.employee.id, 'aplid': 1, 'status': 'REJ', 'status_display': 'Rejected'}
+            await asyncio.to_thread(hub.dispatch, event)
+            await asyncio.to_thread(hub.dispatch, dict(event, employee=self.employee.id + 1))
+            self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 1), event)
+            self.assertTrue(subscription.queue.empty())
+        finally:
+            hub.unsubscribe(subscription)
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    async def test_stream_sends_current_statuses_then_changes(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('leave_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        content = response.streaming_content
+        first = await anext(content)
+        self.assertIn(b'"status": "SUB"', first)
+
+        hub.dispatch({'employee': self.employee.id, 'aplid': self.leave.aplid, 'status': 'ACP', 'status_display': 'Accepted'})
+        self.assertIn(b'"status": "ACP"', await asyncio.wait_for(anext(content), 1))
+
+        # A client disconnect cancels the pending read, which ends the subscription
+        pending = asyncio.ensure_future(anext(content))
+        await asyncio.sleep(0)
+        pending.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await pending
+        self.assertEqual(hub.subscriber_count(), 0)
+
+    async def test_spool_file_broker_feeds_the_hub(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            with override_settings(LEAVE_EVENTS_SPOOL=os.path.join(spool_dir, 'events.spool')):
+                spool_broker = SpoolFileBroker()
+                spool_broker.start()
+                subscription = hub.subscribe(self.employee.id)
+                try:
+                    event = {'employee': self.employee.id, 'aplid': 7, 'status': 'DEF', 'status_display': 'Deffered'}
+                    spool_broker.publish(event)
+                    self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 2), event)
+                finally:
+                    hub.unsubscribe(subscription)
+                    spool_broker.stop()
+
+    async def test_spool_file_broker_survives_bad_lines_and_rotation(self):
+        with tempfile.TemporaryDirectory() as spool_dir:
+            spool = os.path.join(spool_dir, 'events.spool')
+            with override_settings(LEAVE_EVENTS_SPOOL=spool, LEAVE_EVENTS_SPOOL_MAX_BYTES=200):
+                spool_broker = SpoolFileBroker()
+                spool_broker.start()
+                subscription = hub.subscribe(self.employee.id)
+                try:
+                    spool_broker.publish({'aplid': 1})  # No employee: KeyError in dispatch
+                    for aplid in range(2, 8):
+                        event = {'employee': self.employee.id, 'aplid': aplid, 'status': 'ACP', 'status_display': 'Accepted'}
+                        spool_broker.publish(event)
+                        self.assertEqual(await asyncio.wait_for(subscription.queue.get(), 2), event)
+                        self.assertLess(os.path.getsize(spool), 300)
+                finally:
+                    hub.unsubscribe(subscription)
+                    spool_broker.stop()
+
+    def test_wsgi_falls_back_to_reconnecting_client(self):
+        self.client.login(username='emp', password='emppass')
+        response = self.client.get(reverse('leave_events'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'retry: 30000')
+        self.assertContains(response, f'id: {self.leave.aplid}')
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass')
+        self.non_admin_user = User.objects.create_user(username='user', email='user@example.com', password='userpass')
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+
+    def profile_settings(self, **overrides):
+        options = {'PROFILE_ENABLED': True, 'PROFILE_SAMPLE_EVERY': 0, 'PROFILE_INTERVAL': 0.001,
+                   'PROFILE_DIR': self.profile_dir.name}
+        options.update(overrides)
+        return self.settings(**options)
+
+    def slow_view(self, request):
+        time.sleep(0.05)
+        return HttpResponse()
+
+    def request(self, user, **headers):
+        request = self.factory.get('/employees/', **headers)
+        request.user = user
+        request.resolver_match = resolve(reverse('employee_list'))
+        return request
+
+    def test_disabled_middleware_is_removed(self):
+        with self.settings(PROFILE_ENABLED=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                ProfilingMiddleware(self.slow_view)
+
+    def test_header_profiles_superuser_request(self):
+        with self.profile_settings():
+            middleware = ProfilingMiddleware(self.slow_view)
+            response = middleware.process_view(self.request(self.admin_user, HTTP_X_LMS_PROFILE='1'), self.slow_view, (), {})
+            summary, = profile_summaries()
+            capture, = recent_captures()
+
+        self.assertEqual(response['X-LMS-Profile'], 'employee_list.folded')
+        self.assertGreater(summary['samples'], 0)
+        self.assertEqual(capture['view'], 'employee_list')
+        with open(os.path.join(self.profile_dir.name, 'employee_list.folded')) as folded:
+            stack, count = folded.readline().rsplit(' ', 1)
+        self.assertTrue(stack.startswith('LMSApp.profiling:process_view;'))
+        self.assertIn('LMSApp.tests:slow_view', stack)
+
+    def test_header_ignored_for_non_superuser(self):
+        with self.profile_settings():
+            middleware = ProfilingMiddleware(self.slow_view)
+            response = middleware.process_view(self.request(self.non_admin_user, HTTP_X_LMS_PROFILE='1'), self.slow_view, (), {})
+            self.assertIsNone(response)
+            self.assertEqual(recent_captures(), [])
+
+    def test_samples_one_in_n_requests_without_telling_the_client(self):
+        with self.profile_settings(PROFILE_SAMPLE_EVERY=2):
+            middleware = ProfilingMiddleware(self.slow_view)
+            responses = [middleware.process_view(self.request(self.non_admin_user), self.slow_view, (), {})
+                         for _ in range(4)]
+            self.assertEqual(len(recent_captures()), 2)
+        self.assertEqual([response is not None for response in responses], [False, True, False, True])
+        self.assertFalse(any('X-LMS-Profile' in response for response in responses if response is not None))
+
+    def test_recent_captures_reads_the_index_tail(self):
+        with open(os.path.join(self.profile_dir.name, 'captures.jsonl'), 'w') as index:
+            for i in range(300):
+                index.write(f'{{"view": "view{i}"}}\n')
+        with self.settings(PROFILE_DIR=self.profile_dir.name), mock.patch('LMSApp.profiling.CAPTURE_READ_SIZE', 64):
+            captures = recent_captures(limit=5)
+        self.assertEqual([capture['view'] for capture in captures], ['view299', 'view298', 'view297', 'view296', 'view295'])
+
+    def test_profiling_middleware_is_last(self):
+        # Middleware after it would miss process_view for sampled requests
+        self.assertEqual(settings.MIDDLEWARE[-1], 'LMSApp.profiling.ProfilingMiddleware')
+
+    async def test_profiles_sync_views_under_asgi(self):
+        await self.async_client.aforce_login(self.admin_user)
+        with self.profile_settings():
+            response = await self.async_client.get(reverse('employee_list'), headers={'X-LMS-Profile': '1'})
+            capture, = await asyncio.to_thread(recent_captures)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-LMS-Profile'], 'employee_list.folded')
+        self.assertEqual(capture['view'], 'employee_list')
+
+    def test_profile_list_is_admin_only(self):
+        with self.settings(PROFILE_DIR=self.profile_dir.name):
+            self.client.login(username='user', password='userpass')
+            self.assertEqual(self.client.get(reverse('profile_list')).status_code, 403)
+            self.client.login(username='admin', password='adminpass')
+            response = self.client.get(reverse('profile_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'No profiles captured yet.')
+
+    def test_download_serves_only_profile_files(self):
+        with open(os.path.join(self.profile_dir.name, 'employee_list.folded'), 'w') as folded:
+            folded.write('LMSApp.views:employee_list 3\n')
+        with open(os.path.join(self.profile_dir.name, 'notes.txt'), 'w') as notes:
+            notes.write('private\n')
+        self.client.login(username='admin', password='adminpass')
+        with self.settings(PROFILE_DIR=self.profile_dir.name):
+            response = self.client.get(reverse('profile_download', args=['employee_list.folded']))
+            self.assertEqual(b''.join(response.streaming_content), b'LMSApp.views:employee_list 3\n')
+            self.assertEqual(self.client.get(reverse('profile_download', args=['notes.txt'])).status_code, 404)
+
+
+class OrgTreeTest(TestCase):
+
+    def setUp(self):
+        # ceo -> vp -> lead -> dev, and a separate root `other`
+        self.ceo = self.make_employee('ceo', 1)
+        self.vp = self.make_employee('vp', 2, manager=self.ceo)
+        self.lead = self.make_employee('lead', 3, manager=self.vp)
+        self.dev = self.make_employee('dev', 4, manager=self.lead)
+        self.other = self.make_employee('other', 5)
+        self.leave = LeaveApl.objects.create(
+            empid=self.dev, leaveDate=date.today(), returnDate=date.today() + timedelta(days=1), reason='PER',
+        )
+
+    def make_employee(self, username, empid, manager=None):
+        user = User.objects.create_user(username=username, password='pass')
+        return Employee.objects.create(user=user, empid=empid, name=username, email=f'{username}@example.com', manager=manager)
+
+    def paths(self):
+        return set(OrgTreePath.objects.values_list('ancestor__name', 'descendant__name', 'depth'))
+
+    def test_closure_rows_for_new_employees(self):
+        self.assertEqual(
+            {(ancestor, depth) for ancestor, descendant, depth in self.paths() if descendant == 'dev'},
+            {('dev', 0), ('lead', 1), ('vp', 2), ('ceo', 3)},
+        )
+
+    def test_team_applications_cover_every_depth(self):
+        self.assertEqual(list(team_applications(self.ceo)), [self.leave])
+        self.assertEqual(list(team_applications(self.lead)), [self.leave])
+        self.assertEqual(list(team_applications(self.dev)), [])
+        self.assertEqual(list(team_applications(self.other)), [])
+
+    def test_move_relinks_whole_subtree(self):
+        move_employee(self.lead, self.other)
+        paths = self.paths()
+        self.assertIn(('other', 'dev', 2), paths)
+        self.assertNotIn(('vp', 'dev', 2), paths)
+        self.assertNotIn(('ceo', 'lead', 2), paths)
+        self.assertIn(('lead', 'dev', 1), paths)
+        self.assertEqual(list(team_applications(self.vp)), [])
+        self.assertEqual(list(team_applications(self.other)), [self.leave])
+
+    def test_move_under_own_subtree_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            move_employee(self.vp, self.dev)
+        self.vp.refresh_from_db()
+        self.assertEqual(self.vp.manager, self.ceo)
+
+    def test_deleting_manager_detaches_reports(self):
+        self.vp.delete()
+        self.lead.refresh_from_db()
+        self.assertIsNone(self.lead.manager)
+        self.assertEqual(
+            {(ancestor, depth) for ancestor, descendant, depth in self.paths() if descendant == 'dev'},
+            {('dev', 0), ('lead', 1)},
+        )
+
+    def test_manager_can_approve_reports_only(self):
+        self.client.login(username='vp', password='pass')
+        self.assertContains(self.client.get(reverse('team_queue')), 'dev')
+        response = self.client.post(reverse('update_leave_status', args=[self.leave.aplid]), {'status': 'ACP'})
+        self.assertRedirects(response, reverse('team_queue'))
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, 'ACP')
+
+        self.client.login(username='other', password='pass')
+        response = self.client.post(reverse('update_leave_status', args=[self.leave.aplid]), {'status': 'REJ'})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username='dev', password='pass')
+        response = self.client.post(reverse('update_leave_status', args=[self.leave.aplid]), {'status': 'ACP'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_team_queue_forbidden_without_employee(self):
+        User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass')
+        self.client.login(username='admin', password='adminpass')
+        self.assertEqual(self.client.get(reverse('team_queue')).status_code, 403)
+
+    @override_settings(READ_REPLICAS=['replica1'])
+    def test_org_tree_checks_read_from_primary(self):
+        # replica1 is not a configured database, so a check reading a replica
+        # outside TestCase's transaction would fail
+        with mock.patch.object(connections['default'], 'in_atomic_block', False):
+            self.assertTrue(manages(self.vp, self.dev))
+            self.vp.manager = self.dev
+            with self.assertRaises(ValidationError):
+                self.vp.clean()
+
+    def test_employee_form_rejects_cycles(self):
+        form = EmployeeForm(data={'empid': 2, 'name': 'vp', 'email': 'vp@example.com', 'manager': self.lead.pk},
+                            instance=self.vp)
+        self.assertFalse(form.is_valid())
+        self.assertIn('manager', form.errors)
+
+
+class IdentityQueryCountTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin_user = User.objects.create_superuser(username='admin', email='admin@example.com', password='adminpass')
+        self.manager_user = User.objects.create_user(username='boss', password='bosspass')
+        self.manager = Employee.objects.create(user=self.manager_user, empid=3001, name='Boss', email='boss@example.com')
+        self.user = User.objects.create_user(username='emp', password='emppass')
+        self.employee = Employee.objects.create(user=self.user, empid=3002, name='Emp', email='emp@example.com',
+                                                manager=self.manager)
+        self.leave = LeaveApl.objects.create(empid=self.employee, leaveDate=date.today(),
+                                             returnDate=date.today() + timedelta(days=1), reason='PER')
+
+    # Counts include loading the session, which is read from the database
+    # while the cache is per process.
+
+    def assertWarmQueries(self, num, url_name, status_code=200):
+        # The first request loads the identity; later ones take it from the cache
+        self.client.get(reverse(url_name))
+        with self.assertNumQueries(num):
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, status_code)
+
+    def test_public_pages(self):
+        self.assertWarmQueries(0, 'home')
+        self.assertWarmQueries(0, 'login')
+        self.assertWarmQueries(0, 'signup')
+
+        self.client.login(username='emp', password='emppass')
+        self.assertWarmQueries(1, 'home')  # session
+        self.assertWarmQueries(1, 'login', status_code=302)  # session, then redirect home
+
+    def test_logout(self):
+        self.client.login(username='emp', password='emppass')
+        self.client.get(reverse('home'))  # Warm the identity cache
+        with self.assertNumQueries(3):  # session, then the session backend fetches and deletes it
+            self.assertEqual(self.client.get(reverse('logout')).status_code, 302)
+
+    def test_identity_is_one_query_when_cold(self):
+        self.client.login(username='emp', password='emppass')
+        cache.delete_many([IDENTITY_KEY.format(self.client.session.session_key)])
+        with self.assertNumQueries(3):  # session + identity + the history list
+            self.client.get(reverse('history'))
+
+    def test_employee_views(self):
+        self.client.login(username='emp', password='emppass')
+        self.assertWarmQueries(5, 'dashboard')  # session + three counters + application list
+        self.assertWarmQueries(2, 'apply')  # session + employee choices
+        self.assertWarmQueries(2, 'history')
+
+    def test_manager_views(self):
+        self.client.login(username='boss', password='bosspass')
+        self.assertWarmQueries(2, 'team_queue')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['user'].role, 'manager')
+        self.assertContains(response, reverse('team_queue'))
+
+    def test_admin_views(self):
+        self.client.login(username='admin', password='adminpass')
+        self.assertWarmQueries(2, 'admindashboard')
+        self.assertWarmQueries(2, 'employee_list')
+
+    def assertWarmPostQueries(self, num, url, data, status_code=302):
+        self.client.get(reverse('home'))  # Warm the identity cache
+        with self.assertNumQueries(num):
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status_code)
+
+    def test_update_leave_status_as_admin(self):
+        self.client.login(username='admin', password='adminpass')
+        url = reverse('update_leave_status', args=[self.leave.aplid])
+        self.client.get(url)
+        with self.assertNumQueries(2):  # session + the application with its employee
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertWarmPostQueries(3, url, {'status': 'ACP'})  # session + load + update
+
+    def test_update_leave_status_as_manager(self):
+        self.client.login(username='boss', password='bosspass')
+        url = reverse('update_leave_status', args=[self.leave.aplid])
+        self.client.get(url)
+        with self.assertNumQueries(3):  # session + the application + manages()
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertWarmPostQueries(4, url, {'status': 'REJ'})  # session + load + manages() + update
+
+    def test_employee_crud_views(self):
+        self.client.login(username='admin', password='adminpass')
+        self.assertWarmQueries(2, 'employee_create')  # session + manager choices
+        self.assertWarmPostQueries(
+            # session, manager choice + manager FK check + empid check + insert, then the
+            # closure rows (savepoint, lookup, insert, release) and the manager's identity bump
+            10, reverse('employee_create'),
+            {'empid': 3003, 'name': 'New', 'email': 'new@example.com', 'manager': self.manager.pk},
+        )
+
+        url = reverse('employee_update', args=[self.employee.pk])
+        self.client.get(url)
+        with self.assertNumQueries(3):  # session + employee + manager choices
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+        url = reverse('employee_delete', args=[self.employee.pk])
+        self.client.get(url)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_profile_list(self):
+        self.client.login(username='admin', password='adminpass')
+        with tempfile.TemporaryDirectory() as profile_dir, self.settings(PROFILE_DIR=profile_dir):
+            self.assertWarmQueries(1, 'profile_list')
+
+    def test_profile_download(self):
+        self.client.login(username='admin', password='adminpass')
+        with tempfile.TemporaryDirectory() as profile_dir, self.settings(PROFILE_DIR=profile_dir):
+            with open(os.path.join(profile_dir, 'employee_list.folded'), 'w') as folded:
+                folded.write('LMSApp.views:employee_list 3\n')
+            url = reverse('profile_download', args=['employee_list.folded'])
+            self.client.get(url).close()
+            with self.assertNumQueries(1):  # session
+                response = self.client.get(url)
+            response.close()
+        self.assertEqual(response.status_code, 200)
+
+    def test_leave_events(self):
+        self.client.login(username='emp', password='emppass')
+        self.assertWarmQueries(2, 'leave_events')  # session + current statuses
+
+    def test_cached_identity_leaves_out_the_password(self):
+        self.client.login(username='emp', password='emppass')
+        self.client.get(reverse('history'))
+        identity = cache.get(IDENTITY_KEY.format(self.client.session.session_key))
+        self.assertNotIn('password', identity['user'])
+        self.assertNotIn(self.user.password, repr(identity))
+        self.assertEqual(identity['employee']['id'], self.employee.id)
+
+    def test_employee_change_invalidates_cached_identity(self):
+        self.client.login(username='boss', password='bosspass')
+        self.client.get(reverse('dashboard'))
+
+        self.employee.manager = None
+        self.employee.save()
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['user'].role, 'employee')
+        self.assertNotContains(response, reverse('team_queue'))
+
+    def test_model_backend_sessions_move_to_identity_backend(self):
+        # Sessions created before IdentityBackend store ModelBackend as their backend
+        self.client.force_login(self.manager_user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'].role, 'manager')
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], IDENTITY_BACKEND)
+        self.assertWarmQueries(2, 'team_queue')
+
+    def test_deleted_session_is_logged_out(self):
+        # e.g. a logout handled by another process, whose cache this one cannot see
+        self.client.login(username='emp', password='emppass')
+        self.client.get(reverse('history'))
+
+        Session.objects.filter(session_key=self.client.session.session_key).delete()
+
+        self.assertEqual(self.client.get(reverse('history')).status_code, 302)
+
+    def test_password_change_logs_out_cached_sessions(self):
+        self.client.login(username='emp', password='emppass')
+        self.client.get(reverse('history'))
+
+        self.user.set_password('newpass')
+        self.user.save()
+
+        response = self.client.get(reverse('history'))
+        self.assertEqual(response.status_code, 302)
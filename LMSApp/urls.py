@@ -16,9 +16,13 @@ urlpatterns = [
     path('employees/create/', views.employee_create, name='employee_create'),
     path('employees/<int:pk>/update/', views.employee_update, name='employee_update'),
     path('employees/<int:pk>/delete/', views.employee_delete, name='employee_delete'),
+    path('profiles/', views.profile_list, name='profile_list'),
+    path('profiles/<str:name>', views.profile_download, name='profile_download'),
 
     path("apply/", views.apply, name="apply"),
     path('update/<int:aplid>/', views.update_leave_status, name='update_leave_status'),
+    path('team/', views.team_queue, name='team_queue'),
     path("history/", views.history, name="history"),
+    path("history/events/", views.leave_events, name="leave_events"),
 
 ]
\ No newline at end of file
@@ -1,12 +1,20 @@
+import asyncio
+
 from django.shortcuts import render, redirect, HttpResponseRedirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from .models import Employee, LeaveApl, generate_empid
 from .forms import LeaveAplForm, EmployeeForm
+from .events import broker, format_event, hub, leave_event
+from .orgtree import manages, team_applications
+from .profiling import profile_dir, profile_files, profile_summaries, recent_captures
 
 # Admin check decorator
 def admin_required(function):
@@ -94,6 +102,7 @@ def dashboard(request):
         'upcoming_leaves': upcoming_leaves,
         'leave_applications': leave_applications,
         'today': timezone.now().date(),  # Add today's date
+        'is_manager': user.role == 'manager',  # Show the team approval queue link
     }
     
     return render(request, 'emp_dashboard.html', context)
@@ -117,12 +126,26 @@ def apply(request):
 
 @admin_required
 def admindashboard(request):
-    leave_applications = LeaveApl.objects.all()
+    leave_applications = LeaveApl.objects.select_related('empid')
     return render(request, "admin_dashboard.html", {'leave_applications': leave_applications})
 
-@admin_required  # Ensure only admin users can access this
+@login_required
+def team_queue(request):
+    # Applications from everyone under the logged-in manager, at any depth
+    employee = getattr(request.user, 'employee', None)
+    if employee is None:
+        raise PermissionDenied
+    leave_applications = team_applications(employee).select_related('empid')
+    return render(request, 'team_queue.html', {'leave_applications': leave_applications})
+
+@login_required  # Superusers, or the employee's manager at any level
 def update_leave_status(request, aplid):
-    leave_application = get_object_or_404(LeaveApl, aplid=aplid)
+    leave_application = get_object_or_404(LeaveApl.objects.select_related('empid'), aplid=aplid)
+    is_admin = request.user.is_superuser
+    if not is_admin:
+        employee = getattr(request.user, 'employee', None)
+        if employee is None or not manages(employee, leave_application.empid_id):
+            raise PermissionDenied
 
     if request.method == 'POST':
         status = request.POST.get('status')
@@ -130,9 +153,26 @@ def update_leave_status(request, aplid):
             leave_application.status = status
             leave_application.save()
             messages.success(request, f'Leave application {aplid} has been {"approved" if status == "ACP" else "rejected"}.')
-            return redirect('admindashboard')  # Redirect to the admin dashboard after updating
+            return redirect('admindashboard' if is_admin else 'team_queue')  # Back to the queue the approver came from
+
+    return render(request, 'update_leave_details.html', {'leave_application': leave_application})
+
+@admin_required
+def profile_list(request):
+    context = {
+        'enabled': settings.PROFILE_ENABLED,
+        'sample_every': settings.PROFILE_SAMPLE_EVERY,
+        'summaries': profile_summaries(),
+        'captures': recent_captures(),
+    }
+    return render(request, 'profile_list.html', context)
 
-    return render(request, 'update_leave_status.html', {'leave_application': leave_application})
+@admin_required
+def profile_download(request, name):
+    # Only serve collapsed-stack files that the profiler wrote
+    if name not in {path.name for path in profile_files()}:
+        raise Http404
+    return FileResponse(open(profile_dir() / name, 'rb'), as_attachment=True, content_type='text/plain')
 
 @admin_required
 def employee_list(request):
@@ -179,11 +219,50 @@ def employee_delete(request, pk):
 @login_required
 def history(request):
     # Filter leave applications for the logged-in employee
-    leave_applications = LeaveApl.objects.filter(empid=request.user.employee)
+    leave_applications = LeaveApl.objects.filter(empid=request.user.employee).select_related('empid')
     context = {
         "leave_applications": [application.extract() for application in leave_applications],
         'leave_types': leave_types,
         'leave_statuses': leave_statuses,
     }
     
-    return render(request, "history.html", context)
\ No newline at end of file
+    return render(request, "history.html", context)
+
+@login_required
+async def leave_events(request):
+    # Server-sent events stream of status changes for the logged-in employee
+    user = await request.auser()
+    employee = getattr(user, 'employee', None)  # Loaded with the user by IdentityBackend
+    if employee is None:
+        raise Http404
+    employee_id = employee.id
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    async def current_statuses():
+        return [leave_event(application) async for application in LeaveApl.objects.filter(empid_id=employee_id)]
+
+    if not isinstance(request, ASGIRequest):
+        # A WSGI worker cannot hold the connection open; send the current
+        # statuses and let the browser reconnect after the retry delay.
+        body = 'retry: 30000\n\n' + ''.join(format_event(event) for event in await current_statuses())
+        return HttpResponse(body, content_type='text/event-stream', headers=headers)
+
+    async def stream():
+        broker.start()
+        # Subscribe before reading current statuses so no change is missed in between
+        subscription = hub.subscribe(employee_id)
+        try:
+            for event in await current_statuses():
+                yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), settings.LEAVE_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'  # Lets proxies and the server notice dropped clients
+                    continue
+                yield format_event(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    return StreamingHttpResponse(stream(), content_type='text/event-stream', headers=headers)
@@ -33,12 +33,18 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'LMSApp.routers.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'LMSApp.identity.IdentityMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Must stay last: it calls sampled views from process_view, so the
+    # process_view of anything listed after it would be skipped. Exceptions
+    # from a sampled view also bypass process_exception hooks; none of the
+    # middleware above defines one.
+    'LMSApp.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'LMSProject.urls'
@@ -72,6 +78,87 @@ DATABASES = {
     }
 }
 
+# Cache
+# Holds per-session identities and their version keys, and sessions when
+# shared (see SESSION_ENGINE below). The
+# local-memory cache is per process, so identity invalidation (e.g. a
+# demoted or deactivated admin) only reaches the process that made the
+# change; other processes keep the old identity for up to
+# IDENTITY_CACHE_TIMEOUT. A shared backend (Memcached or Redis) is required
+# when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            # Each active user needs an identity and a version entry
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# Sessions are only cached in a shared cache. With a per-process cache a
+# deleted session (logout, password change) would stay valid in every other
+# process that had cached it, until it expired.
+if CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+
+# Read replicas
+# LMS_REPLICA_FILES is a comma-separated list of SQLite files (e.g. copies of
+# db.sqlite3) that serve read-only queries. Writes always go to 'default'.
+for index, replica_file in enumerate(filter(None, os.environ.get('LMS_REPLICA_FILES', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': replica_file.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['LMSApp.routers.ReplicaRouter']
+
+# Seconds a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = 5
+
+
+# Leave status events
+# Broker that fans status changes out to open event streams. InProcessBroker
+# serves a single ASGI process; SpoolFileBroker shares events between
+# processes on one host through LEAVE_EVENTS_SPOOL.
+LEAVE_EVENTS_BROKER = os.environ.get('LEAVE_EVENTS_BROKER', 'LMSApp.events.InProcessBroker')
+LEAVE_EVENTS_SPOOL = os.environ.get('LEAVE_EVENTS_SPOOL', str(BASE_DIR / 'leave_events.spool'))
+# The spool is truncated once it reaches this size. Keep it well above the
+# events written in one poll interval so tailers never skip a line.
+LEAVE_EVENTS_SPOOL_MAX_BYTES = 1024 * 1024
+
+# Seconds between keepalive comments on an idle event stream
+LEAVE_EVENTS_HEARTBEAT = 15
+
+
+# Request profiling
+# With LMS_PROFILE=1, 1 in PROFILE_SAMPLE_EVERY requests (0 = none) and any
+# superuser request with an X-LMS-Profile header is stack-sampled every
+# PROFILE_INTERVAL seconds. Collapsed stacks per view are written to PROFILE_DIR.
+PROFILE_ENABLED = os.environ.get('LMS_PROFILE') == '1'
+PROFILE_SAMPLE_EVERY = int(os.environ.get('LMS_PROFILE_SAMPLE_EVERY', '0'))
+PROFILE_INTERVAL = 0.005
+PROFILE_DIR = os.environ.get('LMS_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+
+
+# Authentication
+# IdentityBackend loads the user, their Employee and role in one query;
+# IdentityMiddleware caches the result per session for IDENTITY_CACHE_TIMEOUT seconds.
+# Sessions created under ModelBackend are moved to IdentityBackend on their
+# next request, so it is the only backend and failed logins hash once.
+AUTHENTICATION_BACKENDS = [
+    'LMSApp.identity.IdentityBackend',
+]
+
+# Kept short: bounds how long another process may serve a stale identity
+IDENTITY_CACHE_TIMEOUT = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators